@@ -0,0 +1,317 @@
+"""query_plans: EXPLAIN QUERY PLAN checks + index advisor for the analytic SQL
+Input: path to the SQLite db (default project_data.db)
+Output: plan for every query weather_calculations.py runs, flagged full scans
+        and temp B-trees, proposed indexes for the flagged steps
+
+    python query_plans.py                  # report only (db opened read-only)
+    python query_plans.py --create         # create the proposed indexes
+    python query_plans.py --check --min-rows 1000
+                                           # exit 1 if a join scans a table
+                                           # w/ >= 1000 rows per outer row
+
+Queries are captured w a trace callback while running the analytic functions
+(same ones visualizations.py / stats_server.py use) against an empty copy of
+the schema, so new queries are checked without copying their SQL here and
+without running the joins on real data. Plans come from the real db.
+
+Index proposals come from the flagged steps: for a scan inside a join loop the
+scanned table's join/filter columns (then its other columns, so the index
+covers the query), for a temp B-tree the GROUP BY / ORDER BY columns. Each
+candidate is tried on the empty schema copy and only proposed if the step
+turns into a SEARCH / the temp B-tree goes away.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import re
+import sqlite3
+import sys
+from itertools import permutations
+
+from stats_server import read_only_uri
+from weather_calculations import (
+    calc_avg_delay_precip,
+    get_avg_delay_by_hour,
+    get_precipitation_by_hour,
+    get_delay_by_airport,
+    sweep_delay_precip,
+)
+
+DB_NAME = "project_data.db"
+
+SQL_KEYWORDS = {"ON", "WHERE", "JOIN", "CROSS", "INNER", "LEFT", "GROUP", "ORDER", "LIMIT"}
+
+# plan steps that aren't tables, e.g. 'SCAN CONSTANT ROW', 'SCAN SUBQUERY 1' (pre-3.36)
+NON_TABLE_STEPS = {"CONSTANT", "SUBQUERY"}
+
+# SCAN/SEARCH step in both plan formats:
+#   3.36+        'SCAN W', 'SEARCH WD USING INTEGER PRIMARY KEY (rowid=?)'
+#   older        'SCAN TABLE WeatherData AS W', 'SEARCH TABLE WeatherDescriptions AS WD ...'
+PLAN_STEP = re.compile(r"(SCAN|SEARCH) (?:TABLE )?(\w+)(?: AS (\w+))?")
+
+
+def empty_schema_copy(conn):
+    # in-memory db w the same tables + indexes but no rows
+    schema_conn = sqlite3.connect(":memory:")
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT sql FROM sqlite_master
+        WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+        ORDER BY type = 'index'
+    """)
+    for (sql,) in cur.fetchall():
+        schema_conn.execute(sql)
+    return schema_conn
+
+
+def capture_analytic_queries(conn):
+    # run every analytic function on an empty schema copy and record the SELECTs
+    schema_conn = empty_schema_copy(conn)
+    queries = []
+
+    def trace(sql):
+        sql = " ".join(sql.split())
+        if sql.upper().startswith("SELECT") and sql not in queries:
+            queries.append(sql)
+
+    schema_conn.set_trace_callback(trace)
+    try:
+        # calc_avg_delay_precip prints + writes a report, neither needed here
+        with contextlib.redirect_stdout(io.StringIO()):
+            calc_avg_delay_precip(schema_conn, output_file=os.devnull)
+        get_avg_delay_by_hour(schema_conn)
+        get_precipitation_by_hour(schema_conn)
+        get_delay_by_airport(schema_conn, "departure")
+        get_delay_by_airport(schema_conn, "arrival")
+        sweep_delay_precip(schema_conn)
+    finally:
+        schema_conn.close()
+
+    return queries
+
+
+def table_aliases(sql):
+    # alias (or bare table name) -> table name for every FROM/JOIN in the query
+    aliases = {}
+    for table, alias in re.findall(r"(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", sql, re.I):
+        aliases[table] = table
+        if alias and alias.upper() not in SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def explain(conn, sql):
+    # (parent, detail) plan rows, e.g. (0, 'SCAN W'), (0, 'USE TEMP B-TREE FOR GROUP BY')
+    return [(row[1], row[3]) for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def plan_step(detail):
+    # ('SCAN' | 'SEARCH', alias or table name) for a loop step, else None
+    step = PLAN_STEP.match(detail)
+    if not step or step.group(2) in NON_TABLE_STEPS:
+        return None
+    return step.group(1), step.group(3) or step.group(2)
+
+
+def analyze_plan(conn, sql, row_counts):
+    # (full scans as [(alias, table, rows, inner)], temp b-tree steps) for one query.
+    # any SCAN reads every row, covering index or not; only SEARCH narrows it.
+    # inner = the scan sits under an earlier loop of the same join, so the
+    # whole table is re-read once per outer row instead of once per query.
+    # table is None if the plan names something that isn't in the db
+    aliases = table_aliases(sql)
+    full_scans = []
+    temp_btrees = []
+    loop_parents = set()
+
+    for parent, detail in explain(conn, sql):
+        step = plan_step(detail)
+        if step:
+            op, name = step
+            if op == "SCAN":
+                table = aliases.get(name, name)
+                if table not in row_counts:
+                    table = None
+                full_scans.append((name, table, row_counts.get(table, 0), parent in loop_parents))
+            loop_parents.add(parent)
+        elif "TEMP B-TREE" in detail:
+            temp_btrees.append(detail)
+
+    return full_scans, temp_btrees
+
+
+def get_row_counts(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+    tables = [row[0] for row in cur.fetchall()]
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in tables}
+
+
+def alias_columns(sql, alias):
+    # columns referenced as alias.col, in order of first use
+    columns = []
+    for column in re.findall(rf"\b{alias}\.(\w+)", sql):
+        if column not in columns:
+            columns.append(column)
+    return columns
+
+
+def index_name(table, columns):
+    return f"idx_{table}_{'_'.join(columns)}"
+
+
+def try_index(schema_conn, sql, table, columns, fixed):
+    # create the candidate on the empty schema copy, True if fixed(plan) holds
+    name = index_name(table, columns)
+    schema_conn.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+    try:
+        return fixed([detail for _, detail in explain(schema_conn, sql)])
+    finally:
+        schema_conn.execute(f"DROP INDEX {name}")
+
+
+def propose_scan_index(schema_conn, sql, alias, table):
+    # index that turns an inner 'SCAN alias' into a SEARCH: join/filter
+    # columns first (trying each order), then the rest of the alias's columns
+    predicates = sql[sql.upper().index(" FROM "):]
+    predicates = re.split(r"\b(?:GROUP|ORDER) BY\b", predicates, flags=re.I)[0]
+    key_columns = alias_columns(predicates, alias)[:4]
+    other_columns = [c for c in alias_columns(sql, alias) if c not in key_columns]
+
+    def searched(plan):
+        return any(plan_step(detail) == ("SEARCH", alias) for detail in plan)
+
+    for size in range(1, len(key_columns) + 1):
+        for key in permutations(key_columns, size):
+            columns = list(key) + [c for c in key_columns + other_columns if c not in key]
+            if try_index(schema_conn, sql, table, columns, searched):
+                return table, columns
+    return None
+
+
+def propose_sort_index(schema_conn, sql, detail, aliases):
+    # index that removes 'USE TEMP B-TREE FOR GROUP BY/ORDER BY', only when the
+    # clause is plain columns of one table (not e.g. an hour expression)
+    clause = "GROUP BY" if "GROUP BY" in detail else "ORDER BY"
+    terms = re.search(rf"\b{clause}\s+(.+?)(?:\s+(?:GROUP BY|ORDER BY|LIMIT)\b|$)", sql, re.I)
+    if not terms:
+        return None
+
+    columns = [re.fullmatch(r"(\w+)\.(\w+)(?:\s+(?:ASC|DESC))?", term.strip(), re.I)
+               for term in terms.group(1).split(",")]
+    if not all(columns) or len({c.group(1) for c in columns}) != 1:
+        return None
+
+    alias = columns[0].group(1)
+    table = aliases.get(alias, alias)
+    key_columns = [c.group(2) for c in columns]
+    columns = key_columns + [c for c in alias_columns(sql, alias) if c not in key_columns]
+
+    def sorted_by_index(plan):
+        return not any(d.startswith("USE TEMP B-TREE") and clause in d for d in plan)
+
+    if try_index(schema_conn, sql, table, columns, sorted_by_index):
+        return table, columns
+    return None
+
+
+def check_query_plans(conn, min_rows=0):
+    # print every plan; return (failures, proposed indexes). failures are full
+    # scans inside a join loop on tables >= min_rows, or scans of a table that
+    # can't be resolved (so they can't slip through as 0 rows)
+    row_counts = get_row_counts(conn)
+    schema_conn = empty_schema_copy(conn)
+    failures = []
+    proposals = []
+
+    def propose(index, detail):
+        if index is None:
+            print(f"  ? no single-table index fixes '{detail}'")
+        else:
+            table, columns = index
+            print(f"  + candidate: CREATE INDEX {index_name(table, columns)} ON {table} ({', '.join(columns)})")
+            if index not in proposals:
+                proposals.append(index)
+
+    for sql in capture_analytic_queries(conn):
+        print(f"\n{sql[:100]}{'...' if len(sql) > 100 else ''}")
+        for _, detail in explain(conn, sql):
+            print(f"  {detail}")
+
+        aliases = table_aliases(sql)
+        full_scans, temp_btrees = analyze_plan(conn, sql, row_counts)
+        for alias, table, rows, inner in full_scans:
+            if table is None:
+                print(f"  ! full scan on {alias}, can't resolve it to a table")
+                failures.append((sql, alias, rows))
+                continue
+
+            where = "inside join loop" if inner else "driving the query"
+            print(f"  ! full scan on {table} ({rows} rows, {where})")
+            if inner:
+                propose(propose_scan_index(schema_conn, sql, alias, table), f"SCAN {alias}")
+                if rows >= min_rows:
+                    failures.append((sql, table, rows))
+
+        for detail in temp_btrees:
+            print(f"  ! {detail.lower()}")
+            propose(propose_sort_index(schema_conn, sql, detail, aliases), detail)
+
+    schema_conn.close()
+    return failures, proposals
+
+
+def create_indexes(conn, proposals):
+    created = []
+    for table, columns in proposals:
+        name = index_name(table, columns)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+        created.append(name)
+    conn.commit()
+    return created
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check query plans for the analytic SQL")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--create", action="store_true", help="create the proposed indexes")
+    parser.add_argument("--check", action="store_true", help="exit 1 if a join loop has a full scan")
+    parser.add_argument("--min-rows", type=int, default=0,
+                        help="only fail --check for scans on tables w at least this many rows")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        sys.exit(f"Database not found: {args.db}")
+
+    # read-only unless we're going to create indexes
+    if args.create:
+        conn = sqlite3.connect(args.db)
+    else:
+        conn = sqlite3.connect(read_only_uri(args.db), uri=True)
+
+    print("QUERY PLANS")
+    failures, proposals = check_query_plans(conn, args.min_rows)
+
+    if proposals:
+        print("\nProposed indexes:")
+        for table, columns in proposals:
+            print(f"  CREATE INDEX {index_name(table, columns)} ON {table} ({', '.join(columns)})")
+
+        if args.create:
+            for name in create_indexes(conn, proposals):
+                print(f"Created index {name}")
+            print("\nQUERY PLANS (after --create)")
+            failures, proposals = check_query_plans(conn, args.min_rows)
+        else:
+            print("(run with --create to add them)")
+
+    conn.close()
+
+    if failures:
+        print(f"\n{len(failures)} full scan(s) inside joins on tables with >= {args.min_rows} rows")
+        if args.check:
+            sys.exit(1)
+    else:
+        print("\nNo full scans inside joins")
@@ -0,0 +1,205 @@
+"""stats_server: local read-only HTTP service for the delay/precipitation stats
+Input: path to the SQLite db (--db, default project_data.db), --host, --port
+Output (JSON): GET /avg_delay_precip, /delay_by_hour, /precip_by_hour,
+               /delay_by_airport?by=departure|arrival
+
+Results are cached in memory and only recomputed after the db changes
+(PRAGMA data_version), so dashboards can poll without re-running the queries.
+"""
+
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from urllib.request import pathname2url
+
+from weather_calculations import (
+    get_delay_precip_stats,
+    get_avg_delay_by_hour,
+    get_precipitation_by_hour,
+    get_delay_by_airport,
+)
+
+DB_NAME = "project_data.db"
+
+
+def read_only_uri(db_name):
+    # quote the path so '?', '#' or '%' in it can't end up in the URI query
+    return f"file:{pathname2url(os.path.abspath(db_name))}?mode=ro"
+
+
+class ReadConnectionPool:
+    """Fixed-size pool of read-only SQLite connections shared by request threads"""
+
+    def __init__(self, db_name, size=4):
+        uri = read_only_uri(db_name)
+        self._pool = queue.Queue()
+        for _ in range(size):
+            self._pool.put(sqlite3.connect(uri, uri=True, check_same_thread=False))
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get().close()
+
+
+class StatsCache:
+    """Caches computed stats until another connection commits to the db"""
+
+    def __init__(self, pool, db_name):
+        self.pool = pool
+        # data_version only changes for commits made by *other* connections,
+        # so keep one dedicated connection just for watching
+        self._watch_conn = sqlite3.connect(read_only_uri(db_name), uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._version = None
+        self._results = {}
+
+    def _data_version(self):
+        return self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def get(self, key, compute):
+        # global lock only covers the version check + dict lookup so cache hits
+        # never wait on a slow query; the per-key lock stops two threads from
+        # computing the same key at once
+        with self._lock:
+            version = self._data_version()
+            if version != self._version:
+                self._results = {}
+                self._version = version
+            if key in self._results:
+                return self._results[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if self._version == version and key in self._results:
+                    return self._results[key]
+
+            with self.pool.connection() as conn:
+                result = compute(conn)
+
+            with self._lock:
+                # don't cache if the db changed while computing
+                if self._version == version:
+                    self._results[key] = result
+            return result
+
+    def close(self):
+        self._watch_conn.close()
+
+
+def avg_delay_precip_stats(conn):
+    stats = get_delay_precip_stats(conn)
+    stats["flight_dates"] = list(stats["flight_dates"])
+    stats["weather_dates"] = list(stats["weather_dates"])
+    return stats
+
+
+def delay_by_hour_stats(conn):
+    return [
+        {"hour": hour, "avg_delay": avg_delay, "flight_count": count}
+        for hour, avg_delay, count in get_avg_delay_by_hour(conn)
+    ]
+
+
+def precip_by_hour_stats(conn):
+    stats = []
+    for hour, total, precip in get_precipitation_by_hour(conn):
+        pct = (precip / total * 100) if total > 0 else 0
+        stats.append({
+            "hour": hour,
+            "total_records": total,
+            "precip_records": precip,
+            "precip_pct": pct,
+        })
+    return stats
+
+
+def delay_by_airport_stats(by):
+    def compute(conn):
+        return [
+            {"airport": airport, "avg_delay": avg_delay,
+             "flight_count": count, "delayed_count": delayed}
+            for airport, avg_delay, count, delayed in get_delay_by_airport(conn, by)
+        ]
+    return compute
+
+
+class StatsHandler(BaseHTTPRequestHandler):
+    routes = {
+        "/avg_delay_precip": avg_delay_precip_stats,
+        "/delay_by_hour": delay_by_hour_stats,
+        "/precip_by_hour": precip_by_hour_stats,
+    }
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        cache = self.server.cache
+
+        try:
+            if url.path in self.routes:
+                body = cache.get(url.path, self.routes[url.path])
+            elif url.path == "/delay_by_airport":
+                by = parse_qs(url.query).get("by", ["departure"])[0]
+                if by not in ("departure", "arrival"):
+                    self.send_json(400, {"error": "by must be 'departure' or 'arrival'"})
+                    return
+                body = cache.get(f"{url.path}?by={by}", delay_by_airport_stats(by))
+            else:
+                self.send_json(404, {"error": f"Unknown endpoint: {url.path}"})
+                return
+        except sqlite3.Error as e:
+            self.send_json(500, {"error": f"Database error: {e}"})
+            return
+
+        self.send_json(200, body)
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_server(db_name=DB_NAME, host="127.0.0.1", port=8000, pool_size=4):
+    server = ThreadingHTTPServer((host, port), StatsHandler)
+    server.pool = ReadConnectionPool(db_name, pool_size)
+    server.cache = StatsCache(server.pool, db_name)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve delay/precipitation stats as JSON")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    server = make_server(args.db, args.host, args.port)
+    host, port = server.server_address
+    print(f"Serving stats from {args.db} on http://{host}:{port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+    finally:
+        server.server_close()
+        server.cache.close()
+        server.pool.close()
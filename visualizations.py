@@ -1,28 +1,13 @@
 import sqlite3
 import matplotlib.pyplot as plt
 from datetime import datetime
+from weather_calculations import get_avg_delay_by_hour, get_precipitation_by_hour
 
 def plot_avg_delay_by_hour(db_name="project_data.db"):
     """Plot average flight delay by hour of day"""
     
     conn = sqlite3.connect(db_name)
-    cur = conn.cursor()
-    
-    query = """
-        SELECT 
-            CAST(SUBSTR(T.timestamp, 12, 2) AS INTEGER) as hour,
-            AVG(fd.delay_minutes) as avg_delay,
-            COUNT(*) as flight_count
-        FROM Flights F
-        JOIN FlightDelays fd ON F.flight_id = fd.flight_id
-        JOIN Timestamps T ON F.scheduled_departure_id = T.id
-        WHERE T.timestamp IS NOT NULL
-        GROUP BY hour
-        ORDER BY hour
-    """
-    
-    cur.execute(query)
-    results = cur.fetchall()
+    results = get_avg_delay_by_hour(conn)
     conn.close()
     
     if not results:
@@ -59,31 +44,7 @@ def plot_avg_precipitation_by_hour(db_name="project_data.db"):
     """Plot percentage of rainy weather by hour of day"""
     
     conn = sqlite3.connect(db_name)
-    cur = conn.cursor()
-
-    query = """
-        SELECT 
-            CAST(STRFTIME('%H', datetime(W.datetime, 'unixepoch')) AS INTEGER) as hour,
-            COUNT(*) as total_records,
-            SUM(CASE 
-                WHEN LOWER(WD.description) LIKE '%rain%' 
-                OR LOWER(WD.description) LIKE '%drizzle%'
-                OR LOWER(WD.description) LIKE '%shower%'
-                OR LOWER(WD.description) LIKE '%thunder%'
-                OR LOWER(WD.description) LIKE '%snow%'
-                OR LOWER(WD.description) LIKE '%sleet%'
-                OR LOWER(WD.description) LIKE '%hail%'
-                THEN 1 ELSE 0 
-            END) as precip_records
-        FROM WeatherData W
-        JOIN WeatherDescriptions WD ON W.description_id = WD.id
-        WHERE W.datetime IS NOT NULL
-        GROUP BY hour
-        ORDER BY hour
-    """
-    
-    cur.execute(query)
-    results = cur.fetchall()
+    results = get_precipitation_by_hour(conn)
     conn.close()
     
     if not results:
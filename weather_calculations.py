@@ -1,134 +1,117 @@
-"""calculate_avg_delay_precipitation(db_conn): calculate avg delay during precipitation
+"""weather_calculations: flight delay + precipitation stats from the project db
 Responsible: Karen
 Input: SQLite connection
-Output (txt): avg departure delay (float) during rainy/snowy weather
+Output (txt): calc_avg_delay_precip writes avg departure delay (float) during
+              rainy/snowy weather to delay_calculations.txt
+Output (rows/dicts): get_delay_precip_stats, get_avg_delay_by_hour,
+              get_precipitation_by_hour, get_delay_by_airport and the
+              sweep_delay_precip window/precip-definition sweep, shared w
+              visualizations.py, stats_server.py and query_plans.py
 """
 
+from bisect import bisect_left, bisect_right
 from datetime import datetime
+from itertools import accumulate
 
-def calc_avg_delay_precip(db_conn, output_file="delay_calculations.txt"):
+# precipitation terms used by calc_avg_delay_precip / get_precipitation_by_hour
+PRECIP_TERMS = ['rain', 'snow', 'drizzle', 'sleet', 'hail']
+VIS_PRECIP_TERMS = ['rain', 'drizzle', 'shower', 'thunder', 'snow', 'sleet', 'hail']
+
+def get_delay_precip_stats(db_conn):
+    # counts, date ranges and avg delay during precipitation as a dict,
+    # no printing / file output (calc_avg_delay_precip writes the report)
     cur = db_conn.cursor()
+    stats = {}
+
+    # flight ct
+    cur.execute("SELECT COUNT(*) FROM Flights")
+    stats["flight_count"] = cur.fetchone()[0]
+
+    # FlightDelays
+    cur.execute("SELECT COUNT(*) FROM FlightDelays WHERE delay_minutes IS NOT NULL")
+    stats["delay_count"] = cur.fetchone()[0]
+
+    # weather
+    cur.execute("SELECT COUNT(*) FROM WeatherData")
+    stats["weather_count"] = cur.fetchone()[0]
+
+    # date ranges; need to join w Timestamps table
+    cur.execute("""
+        SELECT MIN(T.timestamp), MAX(T.timestamp) 
+        FROM Flights F
+        JOIN Timestamps T ON F.scheduled_departure_id = T.id
+        WHERE T.timestamp IS NOT NULL
+    """)
+    stats["flight_dates"] = cur.fetchone()
+
+    cur.execute("""
+        SELECT MIN(FT.timestamp), MAX(FT.timestamp) 
+        FROM WeatherData W
+        JOIN FetchTimestamps FT ON W.fetch_timestamp_id = FT.id
+    """)
+    stats["weather_dates"] = cur.fetchone()
+
+    # check for preci in weather data
+    precip = PRECIP_TERMS
+    precip_condition = " OR ".join([f"LOWER(WD.description) LIKE '%{term}%'" for term in precip])
+
+    cur.execute(f"""
+        SELECT COUNT(*) 
+        FROM WeatherData W
+        JOIN WeatherDescriptions WD ON W.description_id = WD.id
+        WHERE {precip_condition}
+    """)
+    stats["precip_count"] = cur.fetchone()[0]
+
+    # match flights to weather forecasts w/in 3 hours of scheduled departure;
+    # the sweep answers this from sorted times + prefix sums, so the cost
+    # doesn't grow w the number of flight-weather matches like a CROSS JOIN
+    matches = sweep_delay_precip(db_conn, [10800], {"precip": precip})["precip"][10800]
+    stats["match_count"] = matches["total_matches"]
+    stats["precip_match_count"] = matches["precip_matches"]
+    stats["avg_delay"] = matches["avg_delay"]
+    return stats
+
+
+def calc_avg_delay_precip(db_conn, output_file="delay_calculations.txt"):
+    stats = get_delay_precip_stats(db_conn)
     
     with open(output_file, 'w') as f:
         f.write("FLIGHT DELAY DURING PRECIPITATION\n")
 
-        # flight ct
-        cur.execute("SELECT COUNT(*) FROM Flights")
-        flight_count = cur.fetchone()[0]
-        line = f"Total flights: {flight_count}\n"
-        print(line.strip())
-        f.write(line)
-        
-        # FlightDelays
-        cur.execute("SELECT COUNT(*) FROM FlightDelays WHERE delay_minutes IS NOT NULL")
-        delay_count = cur.fetchone()[0]
-        line = f"Flights with delay data: {delay_count}\n"
-        print(line.strip())
-        f.write(line)
-        
-        # weather
-        cur.execute("SELECT COUNT(*) FROM WeatherData")
-        weather_count = cur.fetchone()[0]
-        line = f"Total weather records: {weather_count}\n"
-        print(line.strip())
-        f.write(line)
-        
-        # date ranges; need to join w Timestamps table
-        cur.execute("""
-            SELECT MIN(T.timestamp), MAX(T.timestamp) 
-            FROM Flights F
-            JOIN Timestamps T ON F.scheduled_departure_id = T.id
-            WHERE T.timestamp IS NOT NULL
-        """)
-        flight_dates = cur.fetchone()
-        line = f"Flight dates range: {flight_dates[0]} to {flight_dates[1]}\n"
-        print(line.strip())
-        f.write(line)
-        
-        cur.execute("""
-            SELECT MIN(FT.timestamp), MAX(FT.timestamp) 
-            FROM WeatherData W
-            JOIN FetchTimestamps FT ON W.fetch_timestamp_id = FT.id
-        """)
-        weather_dates = cur.fetchone()
-        line = f"Weather fetch dates range: {weather_dates[0]} to {weather_dates[1]}\n"
-        print(line.strip())
-        f.write(line)
-        
-        # check for preci in weather data
-        precip = ['rain', 'snow', 'drizzle', 'sleet', 'hail']
-        precip_condition = " OR ".join([f"LOWER(WD.description) LIKE '%{term}%'" for term in precip])
-    
-        cur.execute(f"""
-            SELECT COUNT(*) 
-            FROM WeatherData W
-            JOIN WeatherDescriptions WD ON W.description_id = WD.id
-            WHERE {precip_condition}
-        """)
-        precip_count = cur.fetchone()[0]
-        line = f"Weather records with precipitation: {precip_count}\n\n"
-        print(line.strip())
-        f.write(line)
-        
-        # join flights w weather n match flights to weather forecasts w/in 3 hours of scheduled departure
-        flight_weather_sql = """
-            SELECT 
-                fd.delay_minutes,
-                WD.description,
-                T.timestamp as flight_time,
-                W.datetime as weather_time
-            FROM Flights F
-            JOIN FlightDelays fd ON F.flight_id = fd.flight_id
-            JOIN Timestamps T ON F.scheduled_departure_id = T.id
-            CROSS JOIN WeatherData W
-            JOIN WeatherDescriptions WD ON W.description_id = WD.id
-            WHERE fd.delay_minutes IS NOT NULL
-            AND T.timestamp IS NOT NULL
-            AND ABS(
-                (strftime('%s', T.timestamp) - W.datetime)
-            ) <= 10800
-        """
-        
-        cur.execute(flight_weather_sql)
-        rows = cur.fetchall()
-    
-        line = f"Total flight-weather matches within 3 hours: {len(rows)}\n"
-        print(line.strip())
-        f.write(line)
+        lines = [
+            f"Total flights: {stats['flight_count']}\n",
+            f"Flights with delay data: {stats['delay_count']}\n",
+            f"Total weather records: {stats['weather_count']}\n",
+            f"Flight dates range: {stats['flight_dates'][0]} to {stats['flight_dates'][1]}\n",
+            f"Weather fetch dates range: {stats['weather_dates'][0]} to {stats['weather_dates'][1]}\n",
+            f"Weather records with precipitation: {stats['precip_count']}\n\n",
+            f"Total flight-weather matches within 3 hours: {stats['match_count']}\n",
+        ]
+        for line in lines:
+            print(line.strip())
+            f.write(line)
     
-        if len(rows) == 0:
+        if stats["match_count"] == 0:
             error_msg = "Error: No temporal overlap between flights and weather data. Your flight timestamps and weather forecast timestamps don't align, so collect weather data for the same dates as your flights.\n"
             print(error_msg.strip())
             f.write(error_msg)
             return None
-    
-    # # sample matches
-    # print(f"\nSample of matched data (first {min(5, len(rows))} rows):")
-    # for i, row in enumerate(rows[:5]):
-    #     print(f"Delay: {row[0]} min, Weather: {row[1]}")
-    #     print(f"Flight: {row[2]}, Weather: {datetime.fromtimestamp(row[3])}")
-    
-    # cal avg delay during preci weather
-        delays = []
-        for delay, desc, flight_time, weather_time in rows:
-            desc_lower = desc.lower()
-            if any(term in desc_lower for term in precip):
-                delays.append(delay)
-
-        if len(delays) == 0:
-            error_msg = f"\nNo flights found during precipitation weather.\n(Out of {len(rows)} flight-weather matches)\n"
+
+        if stats["precip_match_count"] == 0:
+            error_msg = f"\nNo flights found during precipitation weather.\n(Out of {stats['match_count']} flight-weather matches)\n"
             print(error_msg.strip())
             f.write(error_msg)
             return None
         else:
-            avg_delay = sum(delays) / len(delays)
+            avg_delay = stats["avg_delay"]
             f.write("RESULTS\n")
             
-            line = f"Flights during precipitation: {len(delays)}\n"
+            line = f"Flights during precipitation: {stats['precip_match_count']}\n"
             print(line.strip())
             f.write(line)
             
-            line = f"Total flight-weather matches: {len(rows)}\n"
+            line = f"Total flight-weather matches: {stats['match_count']}\n"
             print(line.strip())
             f.write(line)
             
@@ -137,11 +120,151 @@ def calc_avg_delay_precip(db_conn, output_file="delay_calculations.txt"):
             f.write(line)
             
             return avg_delay
-    
+
+
+def get_avg_delay_by_hour(db_conn):
+    # (hour, avg delay, flight ct) by scheduled departure hour
+    cur = db_conn.cursor()
+    cur.execute("""
+        SELECT 
+            CAST(SUBSTR(T.timestamp, 12, 2) AS INTEGER) as hour,
+            AVG(fd.delay_minutes) as avg_delay,
+            COUNT(*) as flight_count
+        FROM Flights F
+        JOIN FlightDelays fd ON F.flight_id = fd.flight_id
+        JOIN Timestamps T ON F.scheduled_departure_id = T.id
+        WHERE T.timestamp IS NOT NULL
+        GROUP BY hour
+        ORDER BY hour
+    """)
+    return cur.fetchall()
+
+
+def get_precipitation_by_hour(db_conn):
+    # (hour, total weather records, precip records) by forecast hour
+    precip_condition = " OR ".join([f"LOWER(WD.description) LIKE '%{term}%'" for term in VIS_PRECIP_TERMS])
+
+    cur = db_conn.cursor()
+    cur.execute(f"""
+        SELECT 
+            CAST(STRFTIME('%H', datetime(W.datetime, 'unixepoch')) AS INTEGER) as hour,
+            COUNT(*) as total_records,
+            SUM(CASE WHEN {precip_condition} THEN 1 ELSE 0 END) as precip_records
+        FROM WeatherData W
+        JOIN WeatherDescriptions WD ON W.description_id = WD.id
+        WHERE W.datetime IS NOT NULL
+        GROUP BY hour
+        ORDER BY hour
+    """)
+    return cur.fetchall()
+
+
+def get_delay_by_airport(db_conn, by="departure"):
+    # (airport, avg delay, flight ct, delayed flight ct) per departure or arrival airport
+    airport_columns = {
+        "departure": "departure_airport_id",
+        "arrival": "arrival_airport_id",
+    }
+    if by not in airport_columns:
+        raise ValueError(f"by must be one of {list(airport_columns)}")
+
+    cur = db_conn.cursor()
+    cur.execute(f"""
+        SELECT 
+            A.iata_code as airport,
+            AVG(fd.delay_minutes) as avg_delay,
+            COUNT(*) as flight_count,
+            SUM(CASE WHEN fd.delay_minutes > 0 THEN 1 ELSE 0 END) as delayed_count
+        FROM Flights F
+        JOIN FlightDelays fd ON F.flight_id = fd.flight_id
+        JOIN Airports A ON F.{airport_columns[by]} = A.id
+        WHERE fd.delay_minutes IS NOT NULL
+        GROUP BY A.iata_code
+        ORDER BY A.iata_code
+    """)
+    return cur.fetchall()
+
+
+def sweep_delay_precip(db_conn, windows=(10800,), precip_definitions=None):
+    # same matching as calc_avg_delay_precip (every flight-weather pair w/in
+    # window seconds), but for many windows x precip definitions in one pass.
+    # flights are sorted by time w cumulative delay sums, so each weather record
+    # answers a window w 2 bisects instead of a CROSS JOIN per setting
+    if precip_definitions is None:
+        precip_definitions = {"calc": PRECIP_TERMS, "visualizations": VIS_PRECIP_TERMS}
+
+    cur = db_conn.cursor()
+    cur.execute("""
+        SELECT 
+            CAST(strftime('%s', T.timestamp) AS INTEGER) as flight_time,
+            fd.delay_minutes
+        FROM Flights F
+        JOIN FlightDelays fd ON F.flight_id = fd.flight_id
+        JOIN Timestamps T ON F.scheduled_departure_id = T.id
+        WHERE fd.delay_minutes IS NOT NULL
+        AND strftime('%s', T.timestamp) IS NOT NULL
+        ORDER BY flight_time
+    """)
+    flights = cur.fetchall()
+    flight_times = [row[0] for row in flights]
+    delay_sums = [0] + list(accumulate(row[1] for row in flights))
+
+    cur.execute("""
+        SELECT W.datetime, WD.description
+        FROM WeatherData W
+        JOIN WeatherDescriptions WD ON W.description_id = WD.id
+    """)
+    weather_times = {}
+    for weather_time, desc in cur.fetchall():
+        weather_times.setdefault(desc.lower(), []).append(weather_time)
+
+    # (matches, delay sum) per window per description; only a handful of
+    # distinct descriptions so precip definitions are just sums over these
+    desc_totals = {}
+    for window in windows:
+        for desc, times in weather_times.items():
+            matches = 0
+            delay_sum = 0
+            for weather_time in times:
+                lo = bisect_left(flight_times, weather_time - window)
+                hi = bisect_right(flight_times, weather_time + window)
+                matches += hi - lo
+                delay_sum += delay_sums[hi] - delay_sums[lo]
+            desc_totals[(window, desc)] = (matches, delay_sum)
+
+    grid = {}
+    for name, terms in precip_definitions.items():
+        precip_descs = [desc for desc in weather_times if any(term in desc for term in terms)]
+        grid[name] = {}
+        for window in windows:
+            total = sum(desc_totals[(window, desc)][0] for desc in weather_times)
+            count = sum(desc_totals[(window, desc)][0] for desc in precip_descs)
+            delay_sum = sum(desc_totals[(window, desc)][1] for desc in precip_descs)
+            grid[name][window] = {
+                "total_matches": total,
+                "precip_matches": count,
+                "avg_delay": delay_sum / count if count else None,
+            }
+
+    return grid
+
 
 if __name__ == "__main__":
     import sqlite3
     
     conn = sqlite3.connect("project_data.db")
     calc_avg_delay_precip(conn)
+
+    # sensitivity to match window (1-6 hours) and precip definition
+    windows = [hours * 3600 for hours in range(1, 7)]
+    grid = sweep_delay_precip(conn, windows)
+    print("\nSWEEP: avg delay during precipitation by match window")
+    for name, results in grid.items():
+        print(f"{name}:")
+        for window, result in results.items():
+            avg_delay = result["avg_delay"]
+            avg_str = f"{avg_delay:.2f} minutes" if avg_delay is not None else "n/a"
+            print(f"  {window // 3600}h - {avg_str} "
+                  f"({result['precip_matches']} of {result['total_matches']} matches)")
+
     conn.close()
\ No newline at end of file